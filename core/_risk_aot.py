@@ -0,0 +1,64 @@
+"""
+Ahead-of-time build of the risk-metrics kernel.
+
+This module compiles the single-pass risk kernel from core.risk_manager into
+a native extension module (core/risk_aot.*.so) with numba.pycc, so that
+short-lived backtest workers do not pay the JIT warm-up on their first call
+to RiskManager.calculate_risk_metrics. When the extension is present,
+risk_manager uses it in preference to the @njit kernel.
+
+The extension also exports a hash of the kernel source it was built from.
+risk_manager ignores the extension and falls back to the @njit kernel when
+that hash does not match the current _risk_kernel_loop, so rebuild it after
+changing the kernel.
+
+Build it from the repository root (requires Numba and a C compiler):
+
+    python -m core._risk_aot
+"""
+
+import os
+
+import numpy as np
+from numba import njit
+from numba.pycc import CC
+
+from core.risk_manager import _RISK_KERNEL_FASTMATH, _risk_kernel_hash, _risk_kernel_loop
+
+cc = CC('risk_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Compile the shared loop directly rather than importing risk_manager's
+# _risk_kernel, which resolves to this extension once it has been built
+_kernel = njit(fastmath=_RISK_KERNEL_FASTMATH, error_model='numpy')(_risk_kernel_loop)
+
+_KERNEL_HASH = _risk_kernel_hash()
+
+
+@cc.export('kernel_hash', 'i8()')
+def kernel_hash():
+    """Hash of the _risk_kernel_loop source this extension was built from."""
+    return _KERNEL_HASH
+
+
+@cc.export('risk_kernel', 'f8[:](f8[:])')
+def risk_kernel(values):
+    """
+    Compute the risk metrics for a portfolio value array.
+
+    Returns:
+        Array of (volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio)
+    """
+    volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio = _kernel(values)
+
+    result = np.empty(5)
+    result[0] = volatility
+    result[1] = max_drawdown
+    result[2] = sharpe_ratio
+    result[3] = sortino_ratio
+    result[4] = calmar_ratio
+    return result
+
+
+if __name__ == "__main__":
+    cc.compile()
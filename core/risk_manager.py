@@ -6,13 +6,30 @@ including position sizing, stop-loss, and take-profit calculations.
 """
 
 import os
+import math
+import inspect
+import hashlib
 import logging
+import functools
+import warnings
 from abc import ABC, abstractmethod
 from typing import Dict, List, Optional, Union, Any, Tuple
 import pandas as pd
 import numpy as np
 from dotenv import load_dotenv
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    # Precompiled kernel built by core/_risk_aot.py; only used if it was built
+    # from the current _risk_kernel_loop (see _select_risk_kernel)
+    from . import risk_aot
+except ImportError:
+    risk_aot = None
+
 # Load environment variables
 load_dotenv()
 
@@ -24,16 +41,401 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # Default risk parameters from environment variables
-def parse_env_float(env_var, default):
-    """Parse environment variable to float, handling any comments in the value."""
+@functools.lru_cache(maxsize=None)
+def _env_float(env_var: str, default: str) -> float:
+    """
+    Parse an environment variable to float, handling any comments in the value.
+    
+    Results are cached per (env_var, default) for the lifetime of the process,
+    so defaults must be passed as strings to keep the cache key hashable.
+    """
     value = os.getenv(env_var, default)
     # Split by '#' and take only the first part, then strip whitespace
     value = value.split('#')[0].strip()
     return float(value)
 
-DEFAULT_MAX_POSITION_SIZE = parse_env_float('MAX_POSITION_SIZE', '0.02')
-DEFAULT_MAX_DRAWDOWN = parse_env_float('MAX_DRAWDOWN', '0.15')
-DEFAULT_STOP_LOSS_PERCENTAGE = parse_env_float('STOP_LOSS_PERCENTAGE', '0.02')
+# Kept for callers that still use the public name
+parse_env_float = _env_float
+
+DEFAULT_MAX_POSITION_SIZE = _env_float('MAX_POSITION_SIZE', '0.02')
+DEFAULT_MAX_DRAWDOWN = _env_float('MAX_DRAWDOWN', '0.15')
+DEFAULT_STOP_LOSS_PERCENTAGE = _env_float('STOP_LOSS_PERCENTAGE', '0.02')
+
+# Trading days per year used to annualize daily statistics
+TRADING_DAYS_PER_YEAR = 252
+
+# Numba fast-math flags for the risk kernel. 'nnan' and 'ninf' are left out
+# because degenerate histories legitimately produce NaN and inf metrics, and
+# 'reassoc' because combined with the others it lets LLVM fold the kernel's
+# math.isfinite() check (x - x == 0) to True.
+_RISK_KERNEL_FASTMATH = {'nsz', 'arcp', 'contract', 'afn'}
+
+
+def _direction_is_long(direction: str) -> bool:
+    """
+    Convert a legacy 'long'/'short' direction string to an is_long flag.
+    
+    String directions are deprecated in favour of passing is_long directly.
+    """
+    warnings.warn("Passing the trade direction as a string is deprecated; "
+                  "pass is_long=True/False instead",
+                  DeprecationWarning, stacklevel=3)
+    return direction.lower() == 'long'
+
+
+def _as_is_long_array(is_long: Any) -> np.ndarray:
+    """
+    Convert the is_long argument of the batch methods to a boolean array.
+    
+    Only boolean input is accepted: casting would turn every non-empty
+    direction string, including 'short', into True.
+    """
+    is_long = np.asarray(is_long)
+    if is_long.dtype != bool:
+        raise TypeError(f"is_long must be a boolean array, got dtype {is_long.dtype}")
+    return is_long
+
+
+def _annualize_metrics(mean_return: float,
+                       std_return: float,
+                       neg_n: int,
+                       neg_std: float,
+                       max_drawdown: float) -> Tuple[float, float, float, float, float]:
+    """
+    Turn daily return statistics into the annualized risk-metric tuple.
+    
+    Division is done on NumPy scalars so zero denominators give inf/NaN, as
+    pandas did, rather than raising.
+    
+    Args:
+        mean_return: Mean daily return
+        std_return: Sample standard deviation of daily returns
+        neg_n: Number of negative daily returns
+        neg_std: Sample standard deviation of the negative returns
+        max_drawdown: Maximum drawdown (zero or negative)
+        
+    Returns:
+        Tuple of (volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio)
+    """
+    mean_return = np.float64(mean_return)
+    std_return = np.float64(std_return)
+    annualization = np.sqrt(TRADING_DAYS_PER_YEAR)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volatility = std_return * annualization
+        sharpe_ratio = mean_return / std_return * annualization
+        
+        if neg_n > 0:
+            downside_deviation = np.float64(neg_std) * annualization
+            sortino_ratio = mean_return / downside_deviation * annualization
+        else:
+            sortino_ratio = float('inf')  # No negative returns
+        
+        if max_drawdown != 0:
+            calmar_ratio = mean_return * TRADING_DAYS_PER_YEAR / abs(max_drawdown)
+        else:
+            calmar_ratio = float('inf')  # No drawdown
+    
+    return volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio
+
+
+def _returns_kernel_numpy(returns: np.ndarray) -> Tuple[float, float, float, float, float]:
+    """
+    Compute the risk metrics from an array of daily returns with NumPy.
+    
+    Returns that are not finite are skipped, like pandas skips NaN.
+    
+    Args:
+        returns: Daily returns
+        
+    Returns:
+        Tuple of (volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio)
+    """
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        finite = np.isfinite(returns)
+        n = np.count_nonzero(finite)
+        
+        # Skipped returns contribute zero to the sums and leave the curve flat
+        clean_returns = np.where(finite, returns, 0.0)
+        
+        # Sample statistics, matching pandas' ddof=1 default
+        mean_return = clean_returns.sum() / n
+        deviations = np.where(finite, returns - mean_return, 0.0)
+        std_return = np.sqrt(np.dot(deviations, deviations) / (n - 1)) if n > 1 else np.nan
+        
+        # Downside sums without a masked copy: clipping at zero leaves only the
+        # negative returns contributing to the sums and the non-zero count
+        downside_returns = np.minimum(clean_returns, 0.0)
+        neg_n = np.count_nonzero(downside_returns)
+        neg_std = np.nan
+        if neg_n > 1:
+            neg_s = downside_returns.sum()
+            neg_s2 = np.dot(downside_returns, downside_returns)
+            # Sample variance (ddof=1) of the negative returns
+            neg_var = (neg_s2 - neg_s * (neg_s / neg_n)) / (neg_n - 1)
+            neg_std = np.sqrt(max(neg_var, 0.0))
+        
+        # Drawdown of the compounded curve, with the peak and minimum taken
+        # over bars that have a return; fmin ignores NaN drawdowns (0/0)
+        cumulative_returns = np.cumprod(1 + clean_returns)
+        cumulative_max = np.maximum.accumulate(np.where(finite, cumulative_returns, -np.inf))
+        drawdown = np.where(finite, cumulative_returns / cumulative_max - 1, np.inf)
+        max_drawdown = np.fmin.reduce(drawdown, initial=np.inf)
+        if max_drawdown == np.inf:
+            max_drawdown = np.nan  # No drawdown could be computed
+    
+    return _annualize_metrics(mean_return, std_return, neg_n, neg_std, max_drawdown)
+
+
+def _risk_kernel_numpy(values: np.ndarray) -> Tuple[float, float, float, float, float]:
+    """
+    NumPy implementation of the risk kernel, used when Numba is not installed.
+    
+    Returns that are not finite (from NaN or zero portfolio values) are
+    skipped, so both kernels give the same results.
+    
+    Args:
+        values: Portfolio values
+        
+    Returns:
+        Tuple of (volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = values[1:] / values[:-1] - 1
+    
+    return _returns_kernel_numpy(returns)
+
+
+def _risk_kernel_loop(values):
+    """
+    Single-pass risk kernel, compiled with Numba when available.
+    
+    Accumulates return sums, the compounded curve, its running peak and the
+    downside sums in one loop without allocating intermediate arrays. Returns
+    that are not finite (from NaN or zero portfolio values) are skipped, like
+    pandas skips NaN.
+    
+    Args:
+        values: Portfolio values
+        
+    Returns:
+        Tuple of (volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio)
+    """
+    annualization = math.sqrt(TRADING_DAYS_PER_YEAR)
+    
+    n = 0
+    s = 0.0
+    s2 = 0.0
+    neg_s = 0.0
+    neg_s2 = 0.0
+    neg_n = 0
+    cum = 1.0
+    peak = -math.inf
+    max_dd = math.inf
+    
+    for i in range(1, values.shape[0]):
+        r = values[i] / values[i - 1] - 1.0
+        if not math.isfinite(r):
+            continue
+        n += 1
+        s += r
+        s2 += r * r
+        if r < 0.0:
+            neg_s += r
+            neg_s2 += r * r
+            neg_n += 1
+        cum *= 1.0 + r
+        # Explicit comparisons so a NaN drawdown (0/0) is skipped, not kept
+        if cum > peak:
+            peak = cum
+        dd = cum / peak - 1.0
+        if dd < max_dd:
+            max_dd = dd
+    
+    if max_dd == math.inf:
+        max_dd = math.nan  # No drawdown could be computed
+    
+    # Sample variance (ddof=1); clamp tiny negatives from rounding
+    mean = s / n
+    if n > 1:
+        var = (s2 - s * mean) / (n - 1)
+        if var < 0.0:
+            var = 0.0
+        std = math.sqrt(var)
+    else:
+        std = math.nan
+    
+    # The zero-denominator guards below run once per call, outside the loop.
+    # They stay explicit: an epsilon denominator would turn the documented inf
+    # results into large finite values for no measurable gain.
+    if neg_n > 1:
+        neg_var = (neg_s2 - neg_s * (neg_s / neg_n)) / (neg_n - 1)
+        if neg_var < 0.0:
+            neg_var = 0.0
+        downside_deviation = math.sqrt(neg_var) * annualization
+        sortino = mean / downside_deviation * annualization
+    elif neg_n == 1:
+        sortino = math.nan  # Sample deviation of a single value is undefined
+    else:
+        sortino = math.inf  # No negative returns
+    
+    if max_dd != 0.0:
+        calmar = mean * TRADING_DAYS_PER_YEAR / abs(max_dd)
+    else:
+        calmar = math.inf  # No drawdown
+    
+    return std * annualization, max_dd, mean / std * annualization, sortino, calmar
+
+
+def _risk_kernel_aot(values: np.ndarray) -> Tuple[float, float, float, float, float]:
+    """Call the ahead-of-time compiled risk kernel and unpack its result array."""
+    return tuple(risk_aot.risk_kernel(values))
+
+
+def _risk_kernel_hash() -> Optional[int]:
+    """
+    Fingerprint of the risk kernel's source and compile settings.
+    
+    core/_risk_aot.py builds this into the extension, so an extension built
+    from an older _risk_kernel_loop can be detected.
+    
+    Returns:
+        63-bit hash, or None if the kernel source is not available
+    """
+    try:
+        source = inspect.getsource(_risk_kernel_loop)
+    except (OSError, TypeError):
+        return None
+    fingerprint = f"{source}{sorted(_RISK_KERNEL_FASTMATH)}{TRADING_DAYS_PER_YEAR}"
+    return int(hashlib.sha256(fingerprint.encode()).hexdigest()[:15], 16)
+
+
+def _select_risk_kernel(aot_module) -> Any:
+    """
+    Pick the risk kernel implementation.
+    
+    Prefers the AOT build (no JIT warm-up) when its kernel hash matches the
+    current source, then Numba's JIT, then plain NumPy.
+    
+    Args:
+        aot_module: The imported risk_aot extension, or None
+        
+    Returns:
+        Callable mapping a value array to the risk-metric tuple
+    """
+    if aot_module is not None:
+        kernel_hash = getattr(aot_module, 'kernel_hash', None)
+        if kernel_hash is not None and kernel_hash() == _risk_kernel_hash():
+            return _risk_kernel_aot
+        logger.warning("Ignoring core/risk_aot: it was not built from the current risk "
+                       "kernel; rebuild it with 'python -m core._risk_aot'")
+    
+    if njit is not None:
+        # error_model='numpy' lets zero denominators yield inf/NaN instead of raising
+        return njit(cache=True, fastmath=_RISK_KERNEL_FASTMATH,
+                    error_model='numpy')(_risk_kernel_loop)
+    
+    return _risk_kernel_numpy
+
+
+_risk_kernel = _select_risk_kernel(risk_aot)
+
+
+class StreamingRiskState:
+    """
+    Incremental risk-metric state for a portfolio that grows one value at a time.
+    
+    Keeps Welford accumulators for the mean and variance of all returns and of
+    the negative returns, plus the compounded curve and its running peak, so
+    both update() and metrics() are O(1). Returns that are not finite (from
+    NaN or zero values) are skipped as in the batch kernels, so the metrics
+    match RiskManager.calculate_risk_metrics on the same value history.
+    """
+    
+    __slots__ = ('n', 'mean', 'm2', 'neg_n', 'neg_mean', 'neg_m2',
+                 'cum', 'peak', 'max_dd', 'last_v')
+    
+    def __init__(self):
+        """Initialize an empty state."""
+        self.reset()
+    
+    def reset(self) -> None:
+        """Discard all accumulated values."""
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.neg_n = 0
+        self.neg_mean = 0.0
+        self.neg_m2 = 0.0
+        self.cum = 1.0
+        self.peak = -math.inf
+        self.max_dd = math.inf
+        self.last_v = None
+    
+    def update(self, v: float) -> None:
+        """
+        Add the next portfolio value.
+        
+        Args:
+            v: Portfolio value
+        """
+        prev_v = self.last_v
+        self.last_v = v
+        if prev_v is None or prev_v == 0:
+            return
+        
+        r = v / prev_v - 1
+        if not math.isfinite(r):
+            return
+        
+        # Welford update of the return mean and sum of squared deviations
+        self.n += 1
+        delta = r - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (r - self.mean)
+        
+        if r < 0:
+            self.neg_n += 1
+            neg_delta = r - self.neg_mean
+            self.neg_mean += neg_delta / self.neg_n
+            self.neg_m2 += neg_delta * (r - self.neg_mean)
+        
+        # Compounded curve, running peak and drawdown
+        self.cum *= 1 + r
+        if self.cum > self.peak:
+            self.peak = self.cum
+        # A zero peak (a -100% first return) has no defined drawdown; the
+        # batch kernels skip the resulting 0/0 the same way
+        if self.peak != 0:
+            dd = self.cum / self.peak - 1
+            if dd < self.max_dd:
+                self.max_dd = dd
+    
+    def metrics(self) -> Dict[str, float]:
+        """
+        Get the risk metrics for the values seen so far.
+        
+        Returns:
+            Dictionary of risk metrics, empty until a value was added
+        """
+        if self.last_v is None:
+            return {}
+        
+        mean = self.mean if self.n > 0 else math.nan
+        max_dd = self.max_dd if self.max_dd != math.inf else math.nan
+        std = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else math.nan
+        neg_std = math.sqrt(self.neg_m2 / (self.neg_n - 1)) if self.neg_n > 1 else math.nan
+        
+        volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio = _annualize_metrics(
+            mean, std, self.neg_n, neg_std, max_dd)
+        
+        return {
+            'volatility': volatility,
+            'max_drawdown': max_drawdown,
+            'sharpe_ratio': sharpe_ratio,
+            'sortino_ratio': sortino_ratio,
+            'calmar_ratio': calmar_ratio
+        }
 
 
 class RiskManager:
@@ -60,6 +462,12 @@ class RiskManager:
         self.max_drawdown = max_drawdown
         self.stop_loss_percentage = stop_loss_percentage
         
+        # Last (column, data, metrics) computed by calculate_risk_metrics
+        self._metrics_cache: Optional[Tuple[str, np.ndarray, Dict[str, float]]] = None
+        
+        # Incremental state fed by update_portfolio_value
+        self.streaming_state = StreamingRiskState()
+        
         logger.info(f"Risk Manager initialized with max_position_size={max_position_size}, "
                    f"max_drawdown={max_drawdown}, stop_loss_percentage={stop_loss_percentage}")
     
@@ -103,8 +511,9 @@ class RiskManager:
             # Convert to units based on entry price
             position_units = position_size / entry_price
             
-            logger.info(f"Calculated position size: {position_units} units "
-                       f"(value: {position_units * entry_price})")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Calculated position size: %s units (value: %s)",
+                            position_units, position_units * entry_price)
             
             return position_units
         else:
@@ -113,32 +522,42 @@ class RiskManager:
             
             if entry_price is not None:
                 position_units = position_value / entry_price
-                logger.info(f"Calculated position size: {position_units} units "
-                           f"(value: {position_value})")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Calculated position size: %s units (value: %s)",
+                                position_units, position_value)
                 return position_units
             else:
-                logger.info(f"Calculated position value: {position_value}")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("Calculated position value: %s", position_value)
                 return position_value
     
     def calculate_stop_loss(self, 
                            entry_price: float, 
-                           direction: str = 'long',
+                           is_long: Union[bool, str] = True,
                            atr: Optional[float] = None,
                            atr_multiplier: float = 2.0,
-                           custom_percentage: Optional[float] = None) -> float:
+                           custom_percentage: Optional[float] = None,
+                           direction: Optional[str] = None) -> float:
         """
         Calculate the stop-loss price for a trade.
         
         Args:
             entry_price: Entry price for the trade
-            direction: Trade direction ('long' or 'short')
+            is_long: True for a long trade, False for a short trade
             atr: Average True Range value (optional)
             atr_multiplier: Multiplier for ATR-based stop-loss
             custom_percentage: Custom stop-loss percentage (optional)
+            direction: Deprecated trade direction ('long' or 'short'); a string
+                passed as is_long is treated the same way
             
         Returns:
             Stop-loss price
         """
+        if direction is not None:
+            is_long = _direction_is_long(direction)
+        elif isinstance(is_long, str):
+            is_long = _direction_is_long(is_long)
+        
         # Determine the stop-loss percentage
         if custom_percentage is not None:
             stop_percentage = custom_percentage
@@ -149,42 +568,52 @@ class RiskManager:
         if atr is not None:
             stop_distance = atr * atr_multiplier
             
-            if direction.lower() == 'long':
+            if is_long:
                 stop_loss = entry_price - stop_distance
             else:  # short
                 stop_loss = entry_price + stop_distance
                 
-            logger.info(f"Calculated ATR-based stop-loss: {stop_loss} "
-                       f"(ATR: {atr}, multiplier: {atr_multiplier})")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Calculated ATR-based stop-loss: %s (ATR: %s, multiplier: %s)",
+                            stop_loss, atr, atr_multiplier)
         else:
             # Calculate stop-loss based on percentage
-            if direction.lower() == 'long':
+            if is_long:
                 stop_loss = entry_price * (1 - stop_percentage)
             else:  # short
                 stop_loss = entry_price * (1 + stop_percentage)
                 
-            logger.info(f"Calculated percentage-based stop-loss: {stop_loss} "
-                       f"(percentage: {stop_percentage})")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Calculated percentage-based stop-loss: %s (percentage: %s)",
+                            stop_loss, stop_percentage)
         
         return stop_loss
     
     def calculate_take_profit(self, 
                              entry_price: float, 
                              stop_loss_price: float,
-                             direction: str = 'long',
-                             risk_reward_ratio: float = 2.0) -> float:
+                             is_long: Union[bool, str] = True,
+                             risk_reward_ratio: float = 2.0,
+                             direction: Optional[str] = None) -> float:
         """
         Calculate the take-profit price for a trade.
         
         Args:
             entry_price: Entry price for the trade
             stop_loss_price: Stop-loss price for the trade
-            direction: Trade direction ('long' or 'short')
+            is_long: True for a long trade, False for a short trade
             risk_reward_ratio: Desired risk-reward ratio
+            direction: Deprecated trade direction ('long' or 'short'); a string
+                passed as is_long is treated the same way
             
         Returns:
             Take-profit price
         """
+        if direction is not None:
+            is_long = _direction_is_long(direction)
+        elif isinstance(is_long, str):
+            is_long = _direction_is_long(is_long)
+        
         # Calculate the risk (distance to stop-loss)
         risk = abs(entry_price - stop_loss_price)
         
@@ -192,77 +621,172 @@ class RiskManager:
         reward = risk * risk_reward_ratio
         
         # Calculate take-profit price
-        if direction.lower() == 'long':
+        if is_long:
             take_profit = entry_price + reward
         else:  # short
             take_profit = entry_price - reward
         
-        logger.info(f"Calculated take-profit: {take_profit} "
-                   f"(risk: {risk}, reward: {reward}, ratio: {risk_reward_ratio})")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Calculated take-profit: %s (risk: %s, reward: %s, ratio: %s)",
+                        take_profit, risk, reward, risk_reward_ratio)
         
         return take_profit
     
+    def calculate_stop_loss_batch(self, 
+                                  entry_prices: np.ndarray, 
+                                  is_long: np.ndarray,
+                                  atr: Optional[np.ndarray] = None,
+                                  atr_multiplier: float = 2.0,
+                                  custom_percentage: Optional[float] = None) -> np.ndarray:
+        """
+        Calculate stop-loss prices for a batch of trades.
+        
+        Vectorized counterpart of calculate_stop_loss for backtests that
+        evaluate many signals at once.
+        
+        Args:
+            entry_prices: Entry prices for the trades
+            is_long: Boolean array, True for long trades and False for short trades;
+                other dtypes (e.g. 'long'/'short' strings) raise TypeError
+            atr: Average True Range values (optional)
+            atr_multiplier: Multiplier for ATR-based stop-losses
+            custom_percentage: Custom stop-loss percentage (optional)
+            
+        Returns:
+            Array of stop-loss prices
+        """
+        entry_prices = np.asarray(entry_prices, dtype=np.float64)
+        is_long = _as_is_long_array(is_long)
+        
+        # Calculate stop-losses based on ATR if provided
+        if atr is not None:
+            stop_distance = np.asarray(atr, dtype=np.float64) * atr_multiplier
+            return np.where(is_long, entry_prices - stop_distance, entry_prices + stop_distance)
+        
+        # Calculate stop-losses based on percentage
+        if custom_percentage is not None:
+            stop_percentage = custom_percentage
+        else:
+            stop_percentage = self.stop_loss_percentage
+        
+        return np.where(is_long, entry_prices * (1 - stop_percentage), entry_prices * (1 + stop_percentage))
+    
+    def calculate_take_profit_batch(self, 
+                                    entry_prices: np.ndarray, 
+                                    stop_loss_prices: np.ndarray,
+                                    is_long: np.ndarray,
+                                    risk_reward_ratio: float = 2.0) -> np.ndarray:
+        """
+        Calculate take-profit prices for a batch of trades.
+        
+        Vectorized counterpart of calculate_take_profit.
+        
+        Args:
+            entry_prices: Entry prices for the trades
+            stop_loss_prices: Stop-loss prices for the trades
+            is_long: Boolean array, True for long trades and False for short trades;
+                other dtypes (e.g. 'long'/'short' strings) raise TypeError
+            risk_reward_ratio: Desired risk-reward ratio
+            
+        Returns:
+            Array of take-profit prices
+        """
+        entry_prices = np.asarray(entry_prices, dtype=np.float64)
+        stop_loss_prices = np.asarray(stop_loss_prices, dtype=np.float64)
+        is_long = _as_is_long_array(is_long)
+        
+        # Reward distance from the risk (distance to stop-loss)
+        reward = np.abs(entry_prices - stop_loss_prices) * risk_reward_ratio
+        
+        return np.where(is_long, entry_prices + reward, entry_prices - reward)
+    
     def calculate_risk_metrics(self, 
                               portfolio_history: pd.DataFrame) -> Dict[str, float]:
         """
         Calculate risk metrics for a portfolio.
         
+        Daily returns are taken from the 'returns' column when present and
+        derived from the 'value' column otherwise; NaN returns are skipped.
+        A single-row history has no returns and yields NaN metrics (an
+        infinite Sortino ratio), which check_portfolio_risk accepts.
+        
+        portfolio_history is not modified. The most recent result is cached
+        together with a copy of the data it was computed from, so repeated
+        calls on an unchanged history (e.g. once per bar in a backtest) skip
+        the recomputation. The cache is checked against the data itself, not
+        the DataFrame's identity, so in-place edits of any row are picked up.
+        
         Args:
             portfolio_history: DataFrame with portfolio value history
             
         Returns:
             Dictionary of risk metrics
         """
-        if portfolio_history.empty:
+        if len(portfolio_history) == 0:
             logger.warning("Cannot calculate risk metrics for empty portfolio history")
             return {}
         
         try:
-            # Calculate daily returns
-            if 'returns' not in portfolio_history.columns:
-                portfolio_history['returns'] = portfolio_history['value'].pct_change()
+            # Work on a contiguous float64 array (a view when the column already
+            # is one) instead of adding pandas columns
+            has_returns = 'returns' in portfolio_history.columns
+            column = 'returns' if has_returns else 'value'
+            data = np.ascontiguousarray(portfolio_history[column].to_numpy(), dtype=np.float64)
             
-            # Calculate key metrics
-            metrics = {}
+            if self._metrics_cache is not None:
+                cached_column, cached_data, cached_metrics = self._metrics_cache
+                # Bitwise comparison: exact, and treats NaN as equal to itself
+                if (cached_column == column and cached_data.shape == data.shape
+                        and np.array_equal(cached_data.view(np.uint64), data.view(np.uint64))):
+                    return dict(cached_metrics)
             
-            # Volatility (annualized)
-            metrics['volatility'] = portfolio_history['returns'].std() * np.sqrt(252)
-            
-            # Maximum drawdown
-            portfolio_history['cumulative_returns'] = (1 + portfolio_history['returns']).cumprod()
-            portfolio_history['cumulative_max'] = portfolio_history['cumulative_returns'].cummax()
-            portfolio_history['drawdown'] = (portfolio_history['cumulative_returns'] / 
-                                           portfolio_history['cumulative_max'] - 1)
-            metrics['max_drawdown'] = portfolio_history['drawdown'].min()
+            if has_returns:
+                # Caller-supplied returns bypass the compiled values kernel
+                kernel = _returns_kernel_numpy
+            else:
+                kernel = _risk_kernel
             
-            # Sharpe ratio (assuming risk-free rate of 0 for simplicity)
-            metrics['sharpe_ratio'] = (portfolio_history['returns'].mean() / 
-                                     portfolio_history['returns'].std() * np.sqrt(252))
+            volatility, max_drawdown, sharpe_ratio, sortino_ratio, calmar_ratio = kernel(data)
             
-            # Sortino ratio (downside deviation)
-            negative_returns = portfolio_history['returns'][portfolio_history['returns'] < 0]
-            if len(negative_returns) > 0:
-                downside_deviation = negative_returns.std() * np.sqrt(252)
-                metrics['sortino_ratio'] = (portfolio_history['returns'].mean() / 
-                                          downside_deviation * np.sqrt(252))
-            else:
-                metrics['sortino_ratio'] = float('inf')  # No negative returns
+            metrics = {
+                'volatility': volatility,
+                'max_drawdown': max_drawdown,
+                'sharpe_ratio': sharpe_ratio,
+                'sortino_ratio': sortino_ratio,
+                'calmar_ratio': calmar_ratio
+            }
             
-            # Calmar ratio
-            if metrics['max_drawdown'] != 0:
-                metrics['calmar_ratio'] = (portfolio_history['returns'].mean() * 252 / 
-                                         abs(metrics['max_drawdown']))
-            else:
-                metrics['calmar_ratio'] = float('inf')  # No drawdown
+            self._metrics_cache = (column, data.copy(), metrics)
             
             logger.info(f"Calculated risk metrics: {metrics}")
             
-            return metrics
+            return dict(metrics)
             
         except Exception as e:
             logger.error(f"Error calculating risk metrics: {str(e)}")
             return {}
     
+    def update_portfolio_value(self, value: float) -> None:
+        """
+        Feed the next portfolio value into the streaming risk state.
+        
+        Args:
+            value: Latest portfolio value
+        """
+        self.streaming_state.update(value)
+    
+    def streaming_metrics(self) -> Dict[str, float]:
+        """
+        Get risk metrics for all values passed to update_portfolio_value.
+        
+        Unlike calculate_risk_metrics this does not rescan the history, so it
+        is suited to backtests that query the metrics after every bar.
+        
+        Returns:
+            Dictionary of risk metrics
+        """
+        return self.streaming_state.metrics()
+    
     def check_portfolio_risk(self, 
                             portfolio_history: pd.DataFrame) -> Tuple[bool, Dict[str, Any]]:
         """
@@ -325,14 +849,14 @@ if __name__ == "__main__":
     atr = 2.5
     stop_loss = rm.calculate_stop_loss(
         entry_price=entry_price,
-        direction='long',
+        is_long=True,
         atr=atr
     )
     
     take_profit = rm.calculate_take_profit(
         entry_price=entry_price,
         stop_loss_price=stop_loss,
-        direction='long',
+        is_long=True,
         risk_reward_ratio=2.5
     )
     
@@ -340,12 +864,10 @@ if __name__ == "__main__":
     
     # Create a sample portfolio history
     dates = pd.date_range(start='2023-01-01', end='2023-12-31', freq='D')
-    np.random.seed(42)
-    values = [100000]
-    
-    for _ in range(1, len(dates)):
-        daily_return = np.random.normal(0.0005, 0.01)  # Mean 5bps, std 1%
-        values.append(values[-1] * (1 + daily_return))
+    rng = np.random.default_rng(42)
+    daily_returns = rng.normal(0.0005, 0.01, size=len(dates))  # Mean 5bps, std 1%
+    daily_returns[0] = 0  # Start at the initial portfolio value
+    values = 100000 * np.cumprod(1 + daily_returns)
     
     portfolio_history = pd.DataFrame({
         'date': dates,
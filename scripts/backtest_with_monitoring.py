@@ -14,19 +14,11 @@ import logging
 import argparse
 import subprocess
 import threading
-import json
 import datetime
 from pathlib import Path
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("logs/backtest_monitor.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from track_peak_usage import PeakSampler, positive_float, save_peak_data
+
 logger = logging.getLogger('backtest_monitor')
 
 # Create necessary directories
@@ -35,33 +27,20 @@ Path("monitoring").mkdir(exist_ok=True)
 
 def run_peak_usage_monitor(interval=2):
     """
-    Run the peak usage monitoring script in a separate process.
+    Start peak usage monitoring in a background thread of this process.
     
     Args:
-        interval (int): Seconds between measurements
+        interval (float): Seconds between measurements
         
     Returns:
-        subprocess.Popen: The monitoring process
+        PeakSampler: The running sampler; call stop() to collect its data
     """
     logger.info(f"Starting peak usage monitoring with {interval}s interval")
     
-    # Generate a unique filename for this monitoring session
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    output_file = f"monitoring/backtest_peak_usage_{timestamp}.json"
-    
-    # Start the monitoring process without specifying duration (will be terminated later)
-    monitor_cmd = [
-        sys.executable, 
-        "scripts/track_peak_usage.py", 
-        "--interval", str(interval),
-        "--duration", "86400"  # Set a very long duration (24 hours)
-    ]
-    
-    # Start the process and return it
-    process = subprocess.Popen(monitor_cmd)
-    logger.info(f"Peak usage monitoring started with PID {process.pid}")
+    sampler = PeakSampler(interval=interval)
+    sampler.start()
     
-    return process
+    return sampler
 
 def run_backtest(instrument, period, target_return, max_drawdown):
     """
@@ -110,49 +89,32 @@ def run_backtest(instrument, period, target_return, max_drawdown):
     
     return process.returncode, duration, output_file
 
-def get_latest_peak_usage_file():
-    """Get the most recent peak usage JSON file."""
-    peak_files = list(Path("monitoring").glob("peak_usage_*.json"))
-    if not peak_files:
-        return None
-    
-    # Sort by modification time (most recent first)
-    peak_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-    return peak_files[0]
-
-def generate_combined_report(backtest_duration, backtest_output_file, peak_usage_file):
+def generate_combined_report(backtest_duration, backtest_output_file, peak_data):
     """
     Generate a combined report of backtest results and resource usage.
     
     Args:
         backtest_duration (float): Duration of the backtest in seconds
         backtest_output_file (str): Path to the backtest output log
-        peak_usage_file (str): Path to the peak usage JSON file
+        peak_data (dict): Peak usage data collected during the backtest (optional)
     """
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
     report_file = f"monitoring/backtest_performance_report_{timestamp}.txt"
     
-    # Load peak usage data
-    peak_data = None
-    if peak_usage_file and peak_usage_file.exists():
-        with open(peak_usage_file, 'r') as f:
-            peak_data = json.load(f)
-    
     # Extract key metrics from backtest output
     backtest_metrics = {}
     if os.path.exists(backtest_output_file):
         with open(backtest_output_file, 'r') as f:
-            output_lines = f.readlines()
-            
-            # Look for the summary section
+            # Look for the summary section, streaming the log line by line
             in_summary = False
-            for line in output_lines:
+            for line in f:
                 if "=== Backtest Summary ===" in line:
                     in_summary = True
                     continue
                 
+                # The summary ends at the next delimiter; nothing after it is needed
                 if in_summary and "===" in line:
-                    in_summary = False
+                    break
                     
                 if in_summary and ":" in line:
                     parts = line.split(":", 1)
@@ -188,13 +150,9 @@ def generate_combined_report(backtest_duration, backtest_output_file, peak_usage
             f.write(f"  ({peak_data['peak_memory_used_gb']:.2f} GB / {peak_data['memory_total_gb']:.2f} GB)\n")
             f.write(f"  Occurred at: {peak_data['peak_memory_time']}\n\n")
             
-            # Calculate average usage
-            if peak_data['measurements']:
-                avg_cpu = sum(m['cpu_percent'] for m in peak_data['measurements']) / len(peak_data['measurements'])
-                avg_mem = sum(m['memory_percent'] for m in peak_data['measurements']) / len(peak_data['measurements'])
-                
-                f.write(f"Average CPU Usage: {avg_cpu:.2f}%\n")
-                f.write(f"Average RAM Usage: {avg_mem:.2f}%\n")
+            if peak_data.get('avg_cpu_percent') is not None:
+                f.write(f"Average CPU Usage: {peak_data['avg_cpu_percent']:.2f}%\n")
+                f.write(f"Average RAM Usage: {peak_data['avg_memory_percent']:.2f}%\n")
         else:
             f.write("No resource usage data available.\n")
         
@@ -205,21 +163,28 @@ def generate_combined_report(backtest_duration, backtest_output_file, peak_usage
     return report_file
 
 def main():
+    # Setup logging; peak_monitor records from the sampler also go to this log
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("logs/backtest_monitor.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    
     parser = argparse.ArgumentParser(description="Run a backtest with system resource monitoring")
     parser.add_argument("--instrument", type=str, default="EUR_USD", help="Trading instrument (default: EUR_USD)")
     parser.add_argument("--period", type=str, default="6m", help="Backtest period (default: 6m)")
     parser.add_argument("--target-return", type=float, default=0.20, help="Target return percentage (default: 0.20)")
     parser.add_argument("--max-drawdown", type=float, default=0.10, help="Maximum drawdown percentage (default: 0.10)")
-    parser.add_argument("--monitor-interval", type=int, default=2, help="Monitoring interval in seconds (default: 2)")
+    parser.add_argument("--monitor-interval", type=positive_float, default=2, help="Monitoring interval in seconds (default: 2)")
     
     args = parser.parse_args()
     
     try:
         # Start the resource monitoring
-        monitor_process = run_peak_usage_monitor(interval=args.monitor_interval)
-        
-        # Give the monitor a moment to start
-        time.sleep(2)
+        sampler = run_peak_usage_monitor(interval=args.monitor_interval)
         
         # Run the backtest
         return_code, duration, output_file = run_backtest(
@@ -229,18 +194,12 @@ def main():
             args.max_drawdown
         )
         
-        # Stop the monitoring process
-        monitor_process.terminate()
-        monitor_process.wait()
-        
-        # Wait a moment for the monitoring data to be saved
-        time.sleep(2)
-        
-        # Get the latest peak usage file
-        peak_file = get_latest_peak_usage_file()
+        # Stop the monitoring and save its data for future reference
+        peak_data = sampler.stop()
+        save_peak_data(peak_data, prefix="backtest_peak_usage")
         
         # Generate the combined report
-        report_file = generate_combined_report(duration, output_file, peak_file)
+        report_file = generate_combined_report(duration, output_file, peak_data)
         
         # Display the report
         print(f"\nBacktest completed. Performance report saved to: {report_file}\n")
@@ -251,9 +210,9 @@ def main():
         
     except KeyboardInterrupt:
         logger.info("Process interrupted by user")
-        # Ensure the monitoring process is terminated
-        if 'monitor_process' in locals():
-            monitor_process.terminate()
+        # Ensure the monitoring thread is stopped
+        if 'sampler' in locals():
+            sampler.stop()
         return 1
     except Exception as e:
         logger.error(f"Error during backtest monitoring: {str(e)}")
@@ -10,22 +10,21 @@ It records the highest values observed and provides a summary at the end.
 import os
 import sys
 import time
+import math
 import logging
+import threading
 import argparse
 import datetime
 import psutil
 import json
+import numpy as np
 from pathlib import Path
 
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("logs/peak_usage.log"),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger('peak_monitor')
 
 # Create monitoring directory if it doesn't exist
@@ -33,8 +32,13 @@ Path("monitoring").mkdir(exist_ok=True)
 Path("logs").mkdir(exist_ok=True)
 
 def get_current_usage():
-    """Get current CPU and memory usage."""
-    cpu_percent = psutil.cpu_percent(interval=1)
+    """
+    Get current CPU and memory usage.
+    
+    CPU usage is measured without blocking, over the time since the previous
+    call, so callers should prime it once with psutil.cpu_percent(interval=None).
+    """
+    cpu_percent = psutil.cpu_percent(interval=None)
     
     memory = psutil.virtual_memory()
     memory_percent = memory.percent
@@ -49,75 +53,245 @@ def get_current_usage():
         'memory_total_gb': memory_total_gb
     }
 
+def positive_float(value):
+    """Argparse type for a strictly positive number of seconds."""
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {value}")
+    return number
+
+class PeakSampler:
+    """
+    Samples CPU and RAM usage at a fixed interval and tracks the peak values.
+    
+    The sampler runs either in the calling thread via run(), or in a background
+    daemon thread via start() and stop(). Once sampling has finished, the
+    results are available in the peak_data attribute.
+    """
+    
+    # Initial sample buffer size when the monitoring duration is open-ended
+    DEFAULT_CAPACITY = 1024
+    
+    def __init__(self, interval=5):
+        """
+        Initialize the sampler.
+        
+        Args:
+            interval (float): Seconds between measurements; must be positive
+        """
+        if not interval > 0:
+            raise ValueError(f"Sampling interval must be positive, got {interval}")
+        self.interval = interval
+        self.peak_data = None
+        self._stop_event = threading.Event()
+        self._thread = None
+    
+    def start(self, duration=None):
+        """
+        Start sampling in a background daemon thread.
+        
+        Args:
+            duration (float): Maximum monitoring duration in seconds (optional)
+        """
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self.run, args=(duration,),
+                                        name='peak-sampler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """
+        Stop background sampling and wait for the thread to finish.
+        
+        A final sample is taken for the time since the last interval, so a
+        run shorter than one interval still records a measurement.
+        
+        Returns:
+            dict: Peak usage data
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.peak_data
+    
+    def run(self, duration=None):
+        """
+        Sample until the duration elapses or stop() is called.
+        
+        Args:
+            duration (float): Total monitoring duration in seconds, or None to
+                run until stopped
+        
+        Returns:
+            dict: Peak usage data
+        """
+        start_time = time.time()
+        start_tick = time.monotonic()
+        deadline = start_tick + duration if duration is not None else math.inf
+        
+        # Preallocate the sample buffers; samples are taken every `interval` seconds
+        if duration is not None:
+            capacity = int(duration / self.interval) + 1
+        else:
+            capacity = self.DEFAULT_CAPACITY
+        self._timestamps = np.empty(capacity, dtype=np.int64)
+        self._cpu_samples = np.empty(capacity, dtype=np.float32)
+        self._memory_samples = np.empty(capacity, dtype=np.float32)
+        self._sample_count = 0
+        
+        # Running sums so the averages never need another pass over the samples
+        self._cpu_sum = 0.0
+        self._memory_sum = 0.0
+        
+        self.peak_data = {
+            'start_time': datetime.datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S'),
+            'peak_cpu_percent': 0,
+            'peak_cpu_time': None,
+            'peak_memory_percent': 0,
+            'peak_memory_time': None,
+            'peak_memory_used_gb': 0,
+            'memory_total_gb': 0,
+            'avg_cpu_percent': None,
+            'avg_memory_percent': None,
+            'measurements': {}
+        }
+        
+        # Prime psutil's CPU counters so every sample covers exactly one interval
+        psutil.cpu_percent(interval=None)
+        tick = 0
+        last_sample_tick = start_tick
+        
+        try:
+            while True:
+                # Pace against the monotonic clock so processing time does not drift the schedule
+                next_tick = min(start_tick + (tick + 1) * self.interval, deadline)
+                if self._stop_event.wait(max(0, next_tick - time.monotonic())):
+                    # Sample the time since the last tick too, so a run shorter than
+                    # one interval, or the tail of a longer one, is not lost
+                    if time.monotonic() > last_sample_tick:
+                        self._record(get_current_usage())
+                    break
+                tick += 1
+                
+                self._record(get_current_usage())
+                last_sample_tick = time.monotonic()
+                
+                if next_tick >= deadline:
+                    break
+        finally:
+            self._finish(start_tick)
+        
+        return self.peak_data
+    
+    def _record(self, current):
+        """Store one measurement and update the peak values."""
+        peak_data = self.peak_data
+        
+        # Grow the buffers if the run lasts longer than they were sized for
+        if self._sample_count == len(self._cpu_samples):
+            self._timestamps = np.concatenate((self._timestamps, np.empty_like(self._timestamps)))
+            self._cpu_samples = np.concatenate((self._cpu_samples, np.empty_like(self._cpu_samples)))
+            self._memory_samples = np.concatenate((self._memory_samples, np.empty_like(self._memory_samples)))
+        
+        self._timestamps[self._sample_count] = int(time.time())
+        self._cpu_samples[self._sample_count] = current['cpu_percent']
+        self._memory_samples[self._sample_count] = current['memory_percent']
+        self._sample_count += 1
+        self._cpu_sum += current['cpu_percent']
+        self._memory_sum += current['memory_percent']
+        
+        # Update peak CPU if current is higher
+        if current['cpu_percent'] > peak_data['peak_cpu_percent']:
+            peak_data['peak_cpu_percent'] = current['cpu_percent']
+            peak_data['peak_cpu_time'] = current['timestamp']
+            logger.info(f"New peak CPU: {current['cpu_percent']}% at {current['timestamp']}")
+        
+        # Update peak memory if current is higher
+        if current['memory_percent'] > peak_data['peak_memory_percent']:
+            peak_data['peak_memory_percent'] = current['memory_percent']
+            peak_data['peak_memory_time'] = current['timestamp']
+            peak_data['peak_memory_used_gb'] = current['memory_used_gb']
+            peak_data['memory_total_gb'] = current['memory_total_gb']
+            logger.info(f"New peak RAM: {current['memory_percent']}% ({current['memory_used_gb']:.2f} GB) at {current['timestamp']}")
+    
+    def _finish(self, start_tick):
+        """Record the end of the run, the averages and the trimmed sample arrays."""
+        peak_data = self.peak_data
+        sample_count = self._sample_count
+        
+        peak_data['end_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        peak_data['actual_duration'] = time.monotonic() - start_tick
+        if sample_count:
+            peak_data['avg_cpu_percent'] = self._cpu_sum / sample_count
+            peak_data['avg_memory_percent'] = self._memory_sum / sample_count
+        peak_data['measurements'] = {
+            'timestamp': self._timestamps[:sample_count],
+            'cpu_percent': self._cpu_samples[:sample_count],
+            'memory_percent': self._memory_samples[:sample_count]
+        }
+
 def track_peak_usage(interval=5, duration=300):
     """
     Track peak CPU and RAM usage over the specified duration.
     
     Args:
-        interval (int): Seconds between measurements
-        duration (int): Total monitoring duration in seconds
+        interval (float): Seconds between measurements
+        duration (float): Total monitoring duration in seconds
     
     Returns:
         dict: Peak usage data
     """
     logger.info(f"Starting peak usage tracking for {duration}s with {interval}s interval")
     
-    start_time = time.time()
-    end_time = start_time + duration
-    
-    peak_data = {
-        'start_time': datetime.datetime.fromtimestamp(start_time).strftime('%Y-%m-%d %H:%M:%S'),
-        'peak_cpu_percent': 0,
-        'peak_cpu_time': None,
-        'peak_memory_percent': 0,
-        'peak_memory_time': None,
-        'peak_memory_used_gb': 0,
-        'memory_total_gb': 0,
-        'measurements': []
-    }
-    
+    sampler = PeakSampler(interval=interval)
     try:
-        while time.time() < end_time:
-            current = get_current_usage()
-            peak_data['measurements'].append(current)
-            
-            # Update peak CPU if current is higher
-            if current['cpu_percent'] > peak_data['peak_cpu_percent']:
-                peak_data['peak_cpu_percent'] = current['cpu_percent']
-                peak_data['peak_cpu_time'] = current['timestamp']
-                logger.info(f"New peak CPU: {current['cpu_percent']}% at {current['timestamp']}")
-            
-            # Update peak memory if current is higher
-            if current['memory_percent'] > peak_data['peak_memory_percent']:
-                peak_data['peak_memory_percent'] = current['memory_percent']
-                peak_data['peak_memory_time'] = current['timestamp']
-                peak_data['peak_memory_used_gb'] = current['memory_used_gb']
-                peak_data['memory_total_gb'] = current['memory_total_gb']
-                logger.info(f"New peak RAM: {current['memory_percent']}% ({current['memory_used_gb']:.2f} GB) at {current['timestamp']}")
-            
-            # Sleep for the interval (adjusted for processing time)
-            elapsed = time.time() - start_time
-            remaining = min(interval, end_time - time.time())
-            if remaining > 0:
-                time.sleep(remaining)
-    
+        sampler.run(duration)
     except KeyboardInterrupt:
         logger.info("Monitoring stopped by user")
     
-    peak_data['end_time'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    peak_data['actual_duration'] = time.time() - start_time
-    
-    return peak_data
+    return sampler.peak_data
 
-def save_peak_data(peak_data):
-    """Save peak usage data to a JSON file."""
+def _dump_json(obj, f):
+    """Write obj to an open text file as indented JSON, using orjson when installed."""
+    if orjson is not None:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY).decode())
+    else:
+        json.dump(obj, f, indent=2)
+
+def save_peak_data(peak_data, prefix="peak_usage"):
+    """
+    Save peak usage data to disk.
+    
+    The peak values and monitoring period go to a small JSON file; the sample
+    series are stored column-wise in a compressed NPZ file next to it, whose
+    name is recorded under 'measurements_file'.
+    
+    Args:
+        peak_data (dict): Peak usage data
+        prefix (str): Filename prefix inside the monitoring directory
+    
+    Returns:
+        str: Path to the JSON file
+    """
     timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"monitoring/peak_usage_{timestamp}.json"
+    filename = f"monitoring/{prefix}_{timestamp}.json"
+    samples_filename = f"monitoring/{prefix}_{timestamp}.npz"
+    
+    measurements = peak_data['measurements']
+    np.savez_compressed(
+        samples_filename,
+        timestamps=measurements['timestamp'],
+        cpu=measurements['cpu_percent'],
+        mem=measurements['memory_percent']
+    )
+    
+    header = {key: value for key, value in peak_data.items() if key != 'measurements'}
+    header['measurements_file'] = Path(samples_filename).name
     
     with open(filename, 'w') as f:
-        json.dump(peak_data, f, indent=2)
+        _dump_json(header, f)
     
-    logger.info(f"Peak usage data saved to {filename}")
+    logger.info(f"Peak usage data saved to {filename} (samples: {samples_filename})")
     return filename
 
 def display_peak_summary(peak_data):
@@ -133,12 +307,9 @@ def display_peak_summary(peak_data):
     print(f"\nPeak RAM Usage: {peak_data['peak_memory_percent']}% ({peak_data['peak_memory_used_gb']:.2f} GB / {peak_data['memory_total_gb']:.2f} GB)")
     print(f"  Occurred at: {peak_data['peak_memory_time']}")
     
-    # Calculate average usage
-    avg_cpu = sum(m['cpu_percent'] for m in peak_data['measurements']) / len(peak_data['measurements'])
-    avg_mem = sum(m['memory_percent'] for m in peak_data['measurements']) / len(peak_data['measurements'])
-    
-    print(f"\nAverage CPU Usage: {avg_cpu:.2f}%")
-    print(f"Average RAM Usage: {avg_mem:.2f}%")
+    if peak_data['avg_cpu_percent'] is not None:
+        print(f"\nAverage CPU Usage: {peak_data['avg_cpu_percent']:.2f}%")
+        print(f"Average RAM Usage: {peak_data['avg_memory_percent']:.2f}%")
     
     print("\n===============================\n")
 
@@ -156,9 +327,20 @@ def install_dependencies():
         logger.info("Dependencies installed successfully")
 
 def main():
+    # Configure logging here rather than on import, so scripts that import
+    # this module keep their own log file
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("logs/peak_usage.log"),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    
     parser = argparse.ArgumentParser(description="Track peak CPU and RAM usage over time")
-    parser.add_argument("--interval", type=int, default=5, help="Seconds between measurements (default: 5)")
-    parser.add_argument("--duration", type=int, default=300, help="Total monitoring duration in seconds (default: 300)")
+    parser.add_argument("--interval", type=positive_float, default=5, help="Seconds between measurements (default: 5)")
+    parser.add_argument("--duration", type=float, default=300, help="Total monitoring duration in seconds (default: 300)")
     parser.add_argument("--install", action="store_true", help="Install required dependencies")
     
     args = parser.parse_args()
@@ -0,0 +1,7 @@
+"""Shared pytest configuration for the Orbi Wealth Trading System tests."""
+
+import os
+import sys
+
+# Make the top-level packages (core, scripts, ...) importable from the tests
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,215 @@
+"""
+Tests for the risk-metric kernels in core.risk_manager.
+
+The reference is the original pandas implementation of
+RiskManager.calculate_risk_metrics, with returns that are not finite
+(NaN or zero portfolio values) treated as missing.
+"""
+
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core import risk_manager
+from core.risk_manager import RiskManager
+
+METRIC_NAMES = ('volatility', 'max_drawdown', 'sharpe_ratio', 'sortino_ratio', 'calmar_ratio')
+
+SERIES = {
+    'random_walk': 100000 * np.cumprod(1 + np.random.default_rng(7).normal(0.0005, 0.01, 300)),
+    'nan_before_drawdown': [100, np.nan, 100, 80, 70, 75],
+    'nan_inside_drawdown': [100, 100, 80, np.nan, 60, 50],
+    'zero_values': [100, 0, 0, 50, 40, 45],
+    'constant': [100, 100, 100, 100],
+    'single_negative_return': [1, 2, 1.5, 3],
+    'two_values': [100, 90],
+    'single_value': [100],
+}
+
+
+def pandas_reference(values):
+    """Risk metrics computed with the original pandas formulas."""
+    returns = pd.Series(values, dtype=float).pct_change(fill_method=None)
+    returns = returns.replace([np.inf, -np.inf], np.nan)
+    
+    cumulative_returns = (1 + returns).cumprod()
+    drawdown = cumulative_returns / cumulative_returns.cummax() - 1
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        metrics = {
+            'volatility': returns.std() * np.sqrt(252),
+            'max_drawdown': drawdown.min(),
+            'sharpe_ratio': returns.mean() / returns.std() * np.sqrt(252),
+        }
+        
+        negative_returns = returns[returns < 0]
+        if len(negative_returns) > 0:
+            downside_deviation = negative_returns.std() * np.sqrt(252)
+            metrics['sortino_ratio'] = returns.mean() / downside_deviation * np.sqrt(252)
+        else:
+            metrics['sortino_ratio'] = float('inf')
+        
+        if metrics['max_drawdown'] != 0:
+            metrics['calmar_ratio'] = returns.mean() * 252 / abs(metrics['max_drawdown'])
+        else:
+            metrics['calmar_ratio'] = float('inf')
+    
+    return metrics
+
+
+def assert_metrics_match(actual, expected):
+    """Compare metric dictionaries, treating NaN as equal to NaN."""
+    assert set(actual) == set(METRIC_NAMES)
+    for name in METRIC_NAMES:
+        a, e = float(actual[name]), float(expected[name])
+        if math.isnan(e):
+            assert math.isnan(a), name
+        else:
+            assert a == pytest.approx(e, rel=1e-9, abs=1e-12), name
+
+
+def kernels():
+    """The NumPy fallback and, when Numba is installed, the compiled loop."""
+    available = [('numpy', risk_manager._risk_kernel_numpy)]
+    try:
+        from numba import njit
+    except ImportError:
+        return available
+    compiled = njit(fastmath=risk_manager._RISK_KERNEL_FASTMATH,
+                    error_model='numpy')(risk_manager._risk_kernel_loop)
+    available.append(('numba', compiled))
+    return available
+
+
+@pytest.mark.parametrize('kernel_name, kernel', kernels())
+@pytest.mark.parametrize('series_name', sorted(SERIES))
+def test_kernel_matches_pandas(kernel_name, kernel, series_name):
+    values = np.asarray(SERIES[series_name], dtype=np.float64)
+    
+    actual = dict(zip(METRIC_NAMES, kernel(values)))
+    
+    assert_metrics_match(actual, pandas_reference(values))
+
+
+@pytest.mark.parametrize('series_name', sorted(SERIES))
+def test_calculate_risk_metrics_matches_pandas(series_name):
+    values = SERIES[series_name]
+    
+    metrics = RiskManager().calculate_risk_metrics(pd.DataFrame({'value': values}))
+    
+    assert_metrics_match(metrics, pandas_reference(values))
+
+
+def test_nan_value_does_not_hide_drawdown_breach():
+    rm = RiskManager(max_drawdown=0.1)
+    history = pd.DataFrame({'value': SERIES['nan_before_drawdown']})
+    
+    is_acceptable, result = rm.check_portfolio_risk(history)
+    
+    assert not is_acceptable
+    assert result['metrics']['max_drawdown'] == pytest.approx(-0.125)
+
+
+def test_returns_column_is_used_when_present():
+    values = SERIES['random_walk']
+    returns = np.random.default_rng(11).normal(0.001, 0.02, len(values))
+    returns[0] = np.nan
+    history = pd.DataFrame({'value': values, 'returns': returns})
+    
+    metrics = RiskManager().calculate_risk_metrics(history)
+    
+    assert_metrics_match(metrics, pandas_reference(np.cumprod(1 + np.nan_to_num(returns))))
+
+
+def test_single_value_history_passes_risk_check():
+    is_acceptable, result = RiskManager().check_portfolio_risk(pd.DataFrame({'value': [100.0]}))
+    
+    assert is_acceptable
+    assert math.isnan(result['metrics']['max_drawdown'])
+
+
+def test_cached_metrics_follow_in_place_edits():
+    rm = RiskManager()
+    history = pd.DataFrame({'value': [100.0, 110.0, 120.0, 130.0]})
+    rm.calculate_risk_metrics(history)
+    
+    history.loc[1, 'value'] = 50.0
+    
+    assert_metrics_match(rm.calculate_risk_metrics(history), pandas_reference(history['value']))
+
+
+@pytest.mark.parametrize('is_long', [['long', 'short'], [1, 0]])
+def test_batch_methods_reject_non_boolean_is_long(is_long):
+    rm = RiskManager()
+    entry_prices = np.array([100.0, 100.0])
+    
+    with pytest.raises(TypeError):
+        rm.calculate_stop_loss_batch(entry_prices, is_long)
+    with pytest.raises(TypeError):
+        rm.calculate_take_profit_batch(entry_prices, entry_prices * 0.98, is_long)
+
+
+def test_batch_methods_match_scalar_methods():
+    rm = RiskManager()
+    entry_prices = np.array([100.0, 200.0])
+    is_long = np.array([True, False])
+    
+    stop_losses = rm.calculate_stop_loss_batch(entry_prices, is_long)
+    take_profits = rm.calculate_take_profit_batch(entry_prices, stop_losses, is_long)
+    
+    for i in range(2):
+        stop_loss = rm.calculate_stop_loss(entry_prices[i], is_long=bool(is_long[i]))
+        assert stop_losses[i] == pytest.approx(stop_loss)
+        assert take_profits[i] == pytest.approx(
+            rm.calculate_take_profit(entry_prices[i], stop_loss, is_long=bool(is_long[i])))
+
+
+@pytest.mark.parametrize('series_name', sorted(SERIES))
+def test_streaming_metrics_match_calculate_risk_metrics(series_name):
+    values = SERIES[series_name]
+    rm = RiskManager()
+    
+    for value in values:
+        rm.update_portfolio_value(value)
+    
+    assert_metrics_match(rm.streaming_metrics(),
+                         rm.calculate_risk_metrics(pd.DataFrame({'value': values})))
+
+
+def test_stale_aot_extension_is_ignored():
+    current = SimpleNamespace(kernel_hash=risk_manager._risk_kernel_hash)
+    stale = SimpleNamespace(kernel_hash=lambda: 0)
+    unversioned = SimpleNamespace()
+    
+    assert risk_manager._select_risk_kernel(current) is risk_manager._risk_kernel_aot
+    assert risk_manager._select_risk_kernel(stale) is not risk_manager._risk_kernel_aot
+    assert risk_manager._select_risk_kernel(unversioned) is not risk_manager._risk_kernel_aot
+
+
+@pytest.mark.parametrize('legacy_call, boolean_call', [
+    (lambda rm: rm.calculate_stop_loss(100.0, 'short', 2.5),
+     lambda rm: rm.calculate_stop_loss(100.0, is_long=False, atr=2.5)),
+    (lambda rm: rm.calculate_stop_loss(100.0, direction='short', atr=2.5),
+     lambda rm: rm.calculate_stop_loss(100.0, is_long=False, atr=2.5)),
+    (lambda rm: rm.calculate_stop_loss(100.0, 'SHORT', None, 2.0, 0.03),
+     lambda rm: rm.calculate_stop_loss(100.0, is_long=False, custom_percentage=0.03)),
+    (lambda rm: rm.calculate_stop_loss(100.0, 'long'),
+     lambda rm: rm.calculate_stop_loss(100.0, is_long=True)),
+    (lambda rm: rm.calculate_take_profit(100.0, 102.0, 'short', 3.0),
+     lambda rm: rm.calculate_take_profit(100.0, 102.0, is_long=False, risk_reward_ratio=3.0)),
+    (lambda rm: rm.calculate_take_profit(100.0, 102.0, direction='short'),
+     lambda rm: rm.calculate_take_profit(100.0, 102.0, is_long=False)),
+])
+def test_string_direction_is_deprecated_alias_for_is_long(legacy_call, boolean_call):
+    rm = RiskManager()
+    
+    with pytest.warns(DeprecationWarning) as record:
+        legacy_price = legacy_call(rm)
+    
+    # stacklevel=3 attributes the warning to the caller, not to risk_manager
+    assert len(record) == 1
+    assert record[0].filename == __file__
+    assert legacy_price == boolean_call(rm)
@@ -0,0 +1,153 @@
+"""
+Tests for the resource monitoring scripts in scripts/.
+"""
+
+import importlib
+import itertools
+import json
+import os
+import time
+
+import numpy as np
+import pytest
+
+SCRIPTS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+
+@pytest.fixture
+def track_peak_usage(tmp_path, monkeypatch):
+    """The track_peak_usage script module, with the working directory in tmp_path."""
+    # The scripts write to logs/ and monitoring/ relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'logs').mkdir()
+    (tmp_path / 'monitoring').mkdir()
+    monkeypatch.syspath_prepend(SCRIPTS_DIR)
+    return importlib.import_module('track_peak_usage')
+
+
+@pytest.fixture
+def usage_samples(track_peak_usage, monkeypatch):
+    """Replace get_current_usage with a deterministic series; returns the samples handed out."""
+    samples = []
+    counter = itertools.count()
+    
+    def fake_usage():
+        i = next(counter)
+        sample = {
+            'timestamp': f'2024-01-01 00:00:{i % 60:02d}',
+            'cpu_percent': float((i * 37) % 100),
+            'memory_percent': float(40 + i % 5),
+            'memory_used_gb': 4.0 + i % 5,
+            'memory_total_gb': 16.0
+        }
+        samples.append(sample)
+        return sample
+    
+    monkeypatch.setattr(track_peak_usage, 'get_current_usage', fake_usage)
+    return samples
+
+
+def assert_peak_data_matches(peak_data, samples):
+    """Check the recorded series, peaks and averages against the samples handed out."""
+    cpu = [sample['cpu_percent'] for sample in samples]
+    memory = [sample['memory_percent'] for sample in samples]
+    
+    np.testing.assert_array_equal(peak_data['measurements']['cpu_percent'], cpu)
+    np.testing.assert_array_equal(peak_data['measurements']['memory_percent'], memory)
+    assert len(peak_data['measurements']['timestamp']) == len(samples)
+    assert peak_data['peak_cpu_percent'] == max(cpu)
+    assert peak_data['peak_cpu_time'] == samples[cpu.index(max(cpu))]['timestamp']
+    assert peak_data['peak_memory_percent'] == max(memory)
+    assert peak_data['avg_cpu_percent'] == pytest.approx(np.mean(cpu))
+    assert peak_data['avg_memory_percent'] == pytest.approx(np.mean(memory))
+
+
+def test_stop_before_first_interval_records_one_sample(track_peak_usage):
+    sampler = track_peak_usage.PeakSampler(interval=60)
+    sampler.start()
+    
+    peak_data = sampler.stop()
+    
+    assert len(peak_data['measurements']['cpu_percent']) == 1
+    assert peak_data['peak_memory_time'] is not None
+    assert peak_data['avg_memory_percent'] is not None
+
+
+@pytest.mark.parametrize('interval', [0, -1])
+def test_non_positive_interval_is_rejected(track_peak_usage, interval):
+    with pytest.raises(ValueError):
+        track_peak_usage.PeakSampler(interval=interval)
+
+
+
+def test_run_samples_once_per_interval(track_peak_usage, usage_samples):
+    peak_data = track_peak_usage.PeakSampler(interval=0.001).run(duration=0.005)
+    
+    assert len(usage_samples) == 5
+    assert_peak_data_matches(peak_data, usage_samples)
+    assert peak_data['actual_duration'] >= 0.005
+
+
+def test_background_sampling_grows_past_default_capacity(track_peak_usage, usage_samples, monkeypatch):
+    monkeypatch.setattr(track_peak_usage.PeakSampler, 'DEFAULT_CAPACITY', 4)
+    sampler = track_peak_usage.PeakSampler(interval=0.001)
+    
+    sampler.start()
+    deadline = time.monotonic() + 5
+    while len(usage_samples) < 20 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    peak_data = sampler.stop()
+    
+    assert len(usage_samples) >= 20
+    assert_peak_data_matches(peak_data, usage_samples)
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_save_peak_data_round_trip(track_peak_usage, usage_samples, tmp_path, monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(track_peak_usage, 'orjson', None)
+    elif track_peak_usage.orjson is None:
+        pytest.skip("orjson is not installed")
+    peak_data = track_peak_usage.PeakSampler(interval=0.001).run(duration=0.005)
+    
+    filename = track_peak_usage.save_peak_data(peak_data, prefix="test_usage")
+    
+    with open(tmp_path / filename) as f:
+        header = json.load(f)
+    assert 'measurements' not in header
+    assert header['peak_cpu_percent'] == peak_data['peak_cpu_percent']
+    assert header['avg_memory_percent'] == pytest.approx(peak_data['avg_memory_percent'])
+    assert header['start_time'] == peak_data['start_time']
+    
+    with np.load(tmp_path / 'monitoring' / header['measurements_file']) as samples:
+        np.testing.assert_array_equal(samples['timestamps'], peak_data['measurements']['timestamp'])
+        np.testing.assert_array_equal(samples['cpu'], peak_data['measurements']['cpu_percent'])
+        np.testing.assert_array_equal(samples['mem'], peak_data['measurements']['memory_percent'])
+
+
+def test_combined_report_uses_first_summary_block(track_peak_usage, usage_samples, tmp_path):
+    backtest_with_monitoring = importlib.import_module('backtest_with_monitoring')
+    peak_data = track_peak_usage.PeakSampler(interval=0.001).run(duration=0.005)
+    backtest_log = tmp_path / 'logs' / 'backtest_output.log'
+    backtest_log.write_text(
+        "Loading data: EUR_USD\n"
+        "=== Backtest Summary ===\n"
+        "Total Return: 12.5%\n"
+        "Max Drawdown: 4.2%\n"
+        "===========================\n"
+        "=== Backtest Summary ===\n"
+        "Total Return: 99.9%\n"
+        "Sharpe Ratio: 9.9\n"
+        "===========================\n"
+    )
+    
+    report_file = backtest_with_monitoring.generate_combined_report(1.5, str(backtest_log), peak_data)
+    
+    report = (tmp_path / report_file).read_text()
+    assert "Total Return: 12.5%" in report
+    assert "Max Drawdown: 4.2%" in report
+    assert "99.9%" not in report
+    assert "Sharpe Ratio" not in report
+    assert "Loading data" not in report
+    assert f"Peak CPU Usage: {peak_data['peak_cpu_percent']}%" in report
+    assert f"Average CPU Usage: {peak_data['avg_cpu_percent']:.2f}%" in report